@@ -1,5 +1,10 @@
 from __future__ import absolute_import
-import pandas as pd
+import zlib
+import pickle
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
 try:
     import redis
     _HAS_REDIS = True
@@ -7,7 +12,22 @@ except ImportError as e:
     _HAS_REDIS = False
 
 
+def _cache_key(key_prefix, repo_name, key_list, kwargs):
+    """
+    Builds the cache key for a call from the prefix, the repository's name and the keyed keyword arguments.
+
+    :param key_prefix: the prefix for the cached method
+    :param repo_name: the name of the repository the method is called on
+    :param key_list: the names of the keyword arguments that the result depends on
+    :param kwargs: the keyword arguments of the call
+    :return: str
+    """
+    return key_prefix + repo_name + '_'.join([str(kwargs.get(k)) for k in key_list])
+
+
 def multicache(key_prefix, key_list, skip_if=None):
+    key_list = tuple(key_list)
+
     def multicache_nest(func):
         def deco(self, *args, **kwargs):
             if self.cache_backend is None:
@@ -17,7 +37,7 @@ def multicache(key_prefix, key_list, skip_if=None):
                     if skip_if(kwargs):
                         return func(self, *args, **kwargs)
 
-                key = key_prefix + self.repo_name + '_'.join([str(kwargs.get(k)) for k in key_list])
+                key = _cache_key(key_prefix, self.repo_name, key_list, kwargs)
                 try:
                     if isinstance(self.cache_backend, EphemeralCache):
                         ret = self.cache_backend.get(key)
@@ -40,22 +60,100 @@ class CacheMissException(Exception):
     pass
 
 
+class _CountMinSketch(object):
+    """
+    An approximate counter of how often each key has been seen, in a fixed depth x width table of counters. A key
+    increments one counter per row, and its estimate is the smallest of them. Every counter is halved once the
+    sketch has seen 10 x width keys, so that keys which were popular a long time ago lose their weight.
+
+    :param width: the number of counters per row, default 1024
+    :param depth: the number of rows, default 4
+    """
+    __slots__ = ('_width', '_depth', '_counts', '_additions')
+
+    def __init__(self, width=1024, depth=4):
+        self._width = width
+        self._depth = depth
+        self._counts = array('I', [0] * (width * depth))
+        self._additions = 0
+
+    def _indexes(self, k):
+        digest = hashlib.blake2b(str(k).encode('utf-8'), digest_size=4 * self._depth).digest()
+        return [
+            row * self._width + int.from_bytes(digest[4 * row:4 * row + 4], 'little') % self._width
+            for row in range(self._depth)
+        ]
+
+    def add(self, k):
+        for idx in self._indexes(k):
+            self._counts[idx] += 1
+
+        self._additions += 1
+        if self._additions >= 10 * self._width:
+            self._counts = array('I', [x // 2 for x in self._counts])
+            self._additions //= 2
+
+    def estimate(self, k):
+        return min(self._counts[idx] for idx in self._indexes(k))
+
+
 class EphemeralCache():
     """
-    An in-memory ephemeral cache. Basically just a dictionary of saved results.
+    An in-memory ephemeral cache. Basically just a dictionary of saved results, kept in least recently used order so
+    that the oldest entries can be evicted once it is full.
 
+    With admission='tinylfu', a full cache only takes a new key if it has been used at least as often as the least
+    recently used key it would evict, as estimated by a count-min sketch of every get and set. That keeps frequently
+    used results cached through one-off scans over more keys than the cache can hold (e.g. the cumulative blame of a
+    long history), which would flush a plain LRU cache.
+
+    :param max_keys: the max number of keys to cache, default 1000
+    :param admission: (optional, default=None) None to admit every key, or 'tinylfu'
     """
-    def __init__(self):
-        self._cache = dict()
+    __slots__ = ('_cache', '_lock', '_max_keys', '_sketch')
+
+    def __init__(self, max_keys=1000, admission=None):
+        if admission not in [None, 'tinylfu']:
+            raise ValueError('Unknown admission policy: %s' % (admission, ))
+
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_keys = max_keys
+        self._sketch = _CountMinSketch() if admission == 'tinylfu' else None
+
+    def evict(self, n=1):
+        with self._lock:
+            for _ in range(min(n, len(self._cache))):
+                self._cache.popitem(last=False)
 
     def set(self, k, v):
-        self._cache[k] = v
+        # cached methods are called from several threads at once (e.g. parallel_cumulative_blame), so reordering and
+        # evicting are done under the lock
+        with self._lock:
+            if self._sketch is not None:
+                self._sketch.add(k)
+                if k not in self._cache and self._cache and len(self._cache) >= self._max_keys:
+                    victim = next(iter(self._cache))
+                    if self._sketch.estimate(k) < self._sketch.estimate(victim):
+                        return
+
+            self._cache[k] = v
+            self._cache.move_to_end(k)
+            overflow = len(self._cache) - self._max_keys
+
+        if overflow > 0:
+            self.evict(overflow)
 
     def get(self, k):
-        if self.exists(k):
-            return self._cache.get(k)
-        else:
-            raise CacheMissException(k)
+        with self._lock:
+            if self._sketch is not None:
+                self._sketch.add(k)
+
+            if k in self._cache:
+                self._cache.move_to_end(k)
+                return self._cache[k]
+
+        raise CacheMissException(k)
 
     def exists(self, k):
         return k in self._cache
@@ -65,6 +163,9 @@ class RedisDFCache():
     """
     A redis based cache, using redis-py under the hood.
 
+    Values are pickled, so reading one back can run arbitrary code: only use a redis database that nobody untrusted
+    can write to.
+
     :param host: default localhost
     :param port: default 6379
     :param db: the database to use, default 12
@@ -72,11 +173,14 @@ class RedisDFCache():
     :param ttl: time to live for any cached results, default None
     :param kwargs: additional options available to redis.StrictRedis
     """
+    __slots__ = ('_cache', '_key_list', '_lock', '_max_keys', 'ttl', 'prefix')
+
     def __init__(self, host='localhost', port=6379, db=12, max_keys=1000, ttl=None, **kwargs):
         if not _HAS_REDIS:
             raise ImportError('Need redis installed to use redis cache')
         self._cache = redis.StrictRedis(host=host, port=port, db=db, **kwargs)
-        self._key_list = []
+        self._key_list = OrderedDict()
+        self._lock = threading.Lock()
         self._max_keys = max_keys
         self.ttl = ttl
         self.prefix = 'gitpandas_'
@@ -84,44 +188,65 @@ class RedisDFCache():
         # sync with any keys that already exist in this database (order will not be preserved)
         self.sync()
 
+    def _key(self, k):
+        """
+        The redis key for a cache key. Cache keys embed the repository name and the arguments of the cached call, so
+        they are hashed down to a fixed 32 character digest after the prefix. The key is returned as bytes, which is
+        what redis-py sends and what SCAN returns, so tracked keys compare equal to synced ones without re-encoding.
+
+        :param k: the cache key
+        :return: bytes
+        """
+        return (self.prefix + hashlib.blake2b(k.encode('utf-8'), digest_size=16).hexdigest()).encode('utf-8')
+
     def evict(self, n=1):
-        for _ in range(n):
-            key = self._key_list.pop(0)
-            self._cache.delete(key)
+        with self._lock:
+            keys = [self._key_list.popitem(last=False)[0] for _ in range(min(n, len(self._key_list)))]
+        if keys:
+            self._cache.delete(*keys)
 
     def set(self, orik, v):
-        k = self.prefix + orik
-        try:
-            idx = self._key_list.index(k)
-            self._key_list.pop(idx)
-            self._key_list.append(k)
-        except ValueError as e:
-            self._key_list.append(k)
+        k = self._key(orik)
+        self._cache.set(k, zlib.compress(pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)), ex=self.ttl)
 
-        self._cache.set(k, v.to_msgpack(compress='zlib'), ex=self.ttl)
+        # the tracked keys are an ordered set, oldest first, so moving a key to the back and evicting are both O(1)
+        with self._lock:
+            self._key_list[k] = None
+            self._key_list.move_to_end(k)
+            overflow = len(self._key_list) - self._max_keys
 
-        if len(self._key_list) > self._max_keys:
-            self.evict(len(self._key_list) - self._max_keys)
+        if overflow > 0:
+            self.evict(overflow)
 
     def get(self, orik):
-        k = self.prefix + orik
-        if self.exists(orik):
-            return pd.read_msgpack(self._cache.get(k))
+        k = self._key(orik)
+
+        # GET returns None for a missing (or expired) key, so a hit needs no separate EXISTS round trip
+        raw = self._cache.get(k)
+        if raw is not None:
+            return pickle.loads(zlib.decompress(raw))
         else:
-            try:
-                idx = self._key_list.index(k)
-                self._key_list.pop(idx)
-            except ValueError as e:
-                pass
-            raise CacheMissException(k)
+            with self._lock:
+                self._key_list.pop(k, None)
+            raise CacheMissException(orik)
 
     def exists(self, k):
-        k = self.prefix + k
-        return self._cache.exists(k)
+        return self._cache.exists(self._key(k))
+
+    def _scan_keys(self):
+        # a SCAN cursor doesn't block the server the way KEYS does, and the count hint fetches up to 1000 keys per
+        # round trip rather than redis' default of 10
+        return self._cache.scan_iter(match="%s*" % (self.prefix, ), count=1000)
 
     def sync(self):
-        self._key_list = [x for x in self._cache.scan_iter("%s*" % (self.prefix, ))]
+        # SCAN returns str rather than bytes if the client was made with decode_responses
+        keys = [x.encode('utf-8') if isinstance(x, str) else x for x in self._scan_keys()]
+        with self._lock:
+            self._key_list = OrderedDict.fromkeys(keys)
 
     def purge(self):
-        for key in self._cache.scan_iter("%s*" % (self.prefix, )):
-            self._cache.delete(key)
+        keys = list(self._scan_keys())
+        if keys:
+            self._cache.delete(*keys)
+        with self._lock:
+            self._key_list = OrderedDict()
@@ -9,14 +9,13 @@
 """
 
 import math
-import sys
 import os
 import numpy as np
 import pandas as pd
 import requests
 import warnings
 from git import GitCommandError
-from gitpandas.repository import Repository
+from gitpandas.repository import Repository, _FILE_CHANGE_RATES_COLUMNS
 
 try:
     from joblib import delayed, Parallel
@@ -129,16 +128,17 @@ class ProjectDirectory(object):
         :return: DataFrame
         """
 
-        df = pd.DataFrame(columns=['filename', 'lines_covered', 'total_lines', 'coverage', 'repository'])
+        dfs = [pd.DataFrame(columns=['filename', 'lines_covered', 'total_lines', 'coverage', 'repository'])]
 
         for repo in self.repos:
             try:
                 cov = repo.coverage()
                 cov['repository'] = repo.repo_name
-                df = pd.concat([df, cov])
+                dfs.append(cov)
             except GitCommandError:
                 print('Warning! Repo: %s seems to not have coverage' % (repo, ))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -159,10 +159,10 @@ class ProjectDirectory(object):
         :return: DataFrame
         """
 
-        columns = ['unique_committers', 'abs_rate_of_change', 'net_rate_of_change', 'net_change', 'abs_change', 'edit_rate', 'repository']
+        columns = _FILE_CHANGE_RATES_COLUMNS + ['repository']
         if coverage:
             columns += ['lines_covered', 'total_lines', 'coverage']
-        df = pd.DataFrame(columns=columns)
+        dfs = [pd.DataFrame(columns=columns)]
 
         for repo in self.repos:
             try:
@@ -175,10 +175,11 @@ class ProjectDirectory(object):
                     include_globs=include_globs
                 )
                 fcr['repository'] = repo.repo_name
-                df = pd.concat([df, fcr])
+                dfs.append(fcr)
             except GitCommandError:
                 print('Warning! Repo: %s seems to not have the branch: %s' % (repo, branch))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -209,7 +210,7 @@ class ProjectDirectory(object):
         else:
             com = 'author'
 
-        df = pd.DataFrame(columns=[com, 'hours', 'repository'])
+        dfs = [pd.DataFrame(columns=[com, 'hours', 'repository'])]
 
         for repo in self.repos:
             try:
@@ -224,10 +225,11 @@ class ProjectDirectory(object):
                     include_globs=include_globs
                 )
                 ch['repository'] = repo.repo_name
-                df = pd.concat([df, ch])
+                dfs.append(ch)
             except GitCommandError:
                 print('Warning! Repo: %s seems to not have the branch: %s' % (repo, branch))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         if by == 'committer' or by == 'author':
@@ -270,16 +272,17 @@ class ProjectDirectory(object):
         if limit is not None:
             limit = int(limit / len(self.repo_dirs))
 
-        df = pd.DataFrame(columns=['author', 'committer', 'message', 'lines', 'insertions', 'deletions', 'net'])
+        dfs = [pd.DataFrame(columns=['author', 'committer', 'message', 'lines', 'insertions', 'deletions', 'net'])]
 
         for repo in self.repos:
             try:
                 ch = repo.commit_history(branch, limit=limit, days=days, ignore_globs=ignore_globs, include_globs=include_globs)
                 ch['repository'] = repo.repo_name
-                df = pd.concat([df, ch])
+                dfs.append(ch)
             except GitCommandError:
                 print('Warning! Repo: %s seems to not have the branch: %s' % (repo, branch))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -310,7 +313,7 @@ class ProjectDirectory(object):
         if limit is not None:
             limit = int(limit / len(self.repo_dirs))
 
-        df = pd.DataFrame(columns=['repository', 'date', 'author', 'committer', 'message', 'rev', 'filename', 'insertions', 'deletions'])
+        dfs = [pd.DataFrame(columns=['repository', 'date', 'author', 'committer', 'message', 'rev', 'filename', 'insertions', 'deletions'])]
 
         for repo in self.repos:
             try:
@@ -322,10 +325,11 @@ class ProjectDirectory(object):
                     include_globs=include_globs
                 )
                 ch['repository'] = repo.repo_name
-                df = pd.concat([df, ch])
+                dfs.append(ch)
             except GitCommandError:
                 print('Warning! Repo: %s seems to not have the branch: %s' % (repo, branch))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -347,18 +351,16 @@ class ProjectDirectory(object):
         :return: DataFrame
         """
 
-        df = None
+        dfs = []
 
         for repo in self.repos:
             try:
-                if df is None:
-                    df = repo.blame(committer=committer, by=by, ignore_globs=ignore_globs, include_globs=include_globs)
-                else:
-                    df = pd.concat([df, repo.blame(committer=committer, by=by, ignore_globs=ignore_globs, include_globs=include_globs)])
+                dfs.append(repo.blame(committer=committer, by=by, ignore_globs=ignore_globs, include_globs=include_globs))
             except GitCommandError as err:
                 print('Warning! Repo: %s couldnt be blamed' % (repo, ))
                 pass
 
+        df = pd.concat(dfs)
         for lvl in range(df.index.nlevels):
             df = df.reset_index(level=lvl)
 
@@ -388,20 +390,17 @@ class ProjectDirectory(object):
         :return:
         """
 
-        df = None
+        dfs = []
 
         for repo in self.repos:
             try:
-                if df is None:
-                    df = repo.file_detail(ignore_globs=ignore_globs, include_globs=include_globs, committer=committer, rev=rev)
-                    df['repository'] = repo.repo_name
-                else:
-                    chunk = repo.file_detail(ignore_globs=ignore_globs, include_globs=include_globs, committer=committer, rev=rev)
-                    chunk['repository'] = repo.repo_name
-                    df = pd.concat([df, chunk])
+                chunk = repo.file_detail(ignore_globs=ignore_globs, include_globs=include_globs, committer=committer, rev=rev)
+                chunk['repository'] = repo.repo_name
+                dfs.append(chunk)
             except GitCommandError:
                 print('Warning! Repo: %s couldnt be inspected' % (repo, ))
 
+        df = pd.concat(dfs)
         df = df.reset_index(level=-1)
         df = df.set_index(['file', 'repository'])
         return df
@@ -417,22 +416,21 @@ class ProjectDirectory(object):
         :returns: DataFrame
         """
 
-        df = pd.DataFrame(columns=['repository', 'local', 'branch'])
+        dfs = [pd.DataFrame(columns=['repository', 'local', 'branch'])]
 
         if _has_joblib:
-            ds = Parallel(n_jobs=-1, backend='threading', verbose=0)(
+            dfs += Parallel(n_jobs=-1, backend='threading', verbose=0)(
                 delayed(_branches_func)
                 (x) for x in self.repos
             )
-            for d in ds:
-                df = pd.concat([df, d])
         else:
             for repo in self.repos:
                 try:
-                    df = pd.concat([df, _branches_func(repo)])
+                    dfs.append(_branches_func(repo))
                 except GitCommandError:
                     print('Warning! Repo: %s couldn\'t be inspected' % (repo, ))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -459,24 +457,23 @@ class ProjectDirectory(object):
         if num_datapoints is not None:
             num_datapoints = math.floor(float(num_datapoints) / len(self.repos))
 
-        df = pd.DataFrame(columns=['repository', 'rev'])
+        dfs = [pd.DataFrame(columns=['repository', 'rev'])]
 
         if _has_joblib:
-            ds = Parallel(n_jobs=-1, backend='threading', verbose=0)(
+            dfs += Parallel(n_jobs=-1, backend='threading', verbose=0)(
                 delayed(_revs_func)
                 (x, branch, limit, skip, num_datapoints) for x in self.repos
             )
-            for d in ds:
-                df = pd.concat([df, d])
         else:
             for repo in self.repos:
                 try:
                     revs = repo.revs(branch=branch, limit=limit, skip=skip, num_datapoints=num_datapoints)
                     revs['repository'] = repo.repo_name
-                    df = pd.concat([df, revs])
+                    dfs.append(revs)
                 except GitCommandError:
                     print('Warning! Repo: %s couldn\'t be inspected' % (repo, ))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         return df
@@ -515,7 +512,8 @@ class ProjectDirectory(object):
                     ignore_globs=ignore_globs,
                     include_globs=include_globs
                 )
-                blames.append((repo.repo_name, blame))
+                # the repository label is a string column, it is carried in the column names instead
+                blames.append((repo.repo_name, blame.drop(columns=['repository'], errors='ignore')))
             except GitCommandError:
                 print('Warning! Repo: %s couldn\'t be inspected' % (repo, ))
                 pass
@@ -527,37 +525,16 @@ class ProjectDirectory(object):
             blame.columns = [x + '__' + reponame for x in blame.columns.values]
             global_blame = pd.merge(global_blame, blame, left_index=True, right_index=True, how='outer')
 
-        global_blame.fillna(method='pad', inplace=True)
-        global_blame.fillna(0.0, inplace=True)
+        global_blame = global_blame.ffill()
+        global_blame = global_blame.fillna(0.0)
 
+        # sum the committer__project columns into one column per committer or per project in a single grouped reduction
         if by == 'committer':
-            committers = [(str(x).split('__')[0].lower().strip(), x) for x in global_blame.columns.values]
-
-            if sys.version_info.major == 2:
-                committer_mapping = dict([(c, [x[1] for x in committers if x[0] == c]) for c in set([x[0] for x in committers])])
-            else:
-                committer_mapping = {c: [x[1] for x in committers if x[0] == c] for c in {x[0] for x in committers}}
-
-            for committer in committer_mapping.keys():
-                global_blame[committer] = 0
-                for col in committer_mapping.get(committer, []):
-                    global_blame[committer] += global_blame[col]
-
-            global_blame = global_blame.reindex(columns=list(committer_mapping.keys()))
+            committers = [str(x).split('__')[0].lower().strip() for x in global_blame.columns.values]
+            global_blame = global_blame.T.groupby(committers).sum().T
         elif by == 'project':
-            projects = [(str(x).split('__')[1].lower().strip(), x) for x in global_blame.columns.values]
-
-            if sys.version_info.major == 2:
-                project_mapping = dict([(c, [x[1] for x in projects if x[0] == c]) for c in set([x[0] for x in projects])])
-            else:
-                project_mapping = {c: [x[1] for x in projects if x[0] == c] for c in {x[0] for x in projects}}
-
-            for project in project_mapping.keys():
-                global_blame[project] = 0
-                for col in project_mapping.get(project, []):
-                    global_blame[project] += global_blame[col]
-
-            global_blame = global_blame.reindex(columns=list(project_mapping.keys()))
+            projects = [str(x).split('__')[1].lower().strip() for x in global_blame.columns.values]
+            global_blame = global_blame.T.groupby(projects).sum().T
 
         global_blame = global_blame[~global_blame.index.duplicated()]
 
@@ -684,13 +661,14 @@ class ProjectDirectory(object):
 
             return pd.DataFrame([['projectd', tc]], columns=['projectd', 'bus factor'])
         elif by == 'repository':
-            df = pd.DataFrame(columns=['repository', 'bus factor'])
+            dfs = [pd.DataFrame(columns=['repository', 'bus factor'])]
             for repo in self.repos:
                 try:
-                    df = pd.concat([df, repo.bus_factor(ignore_globs=include_globs, include_globs=include_globs, by=by)])
+                    dfs.append(repo.bus_factor(ignore_globs=include_globs, include_globs=include_globs, by=by))
                 except GitCommandError:
                     print('Warning! Repo: %s couldn\'t be inspected' % (repo, ))
 
+            df = pd.concat(dfs)
             df.reset_index()
             return df
 
@@ -716,7 +694,7 @@ class ProjectDirectory(object):
         :return: DataFrame
         """
 
-        df = pd.DataFrame()
+        dfs = [pd.DataFrame()]
 
         if by == 'repository':
             repo_by = None
@@ -735,10 +713,11 @@ class ProjectDirectory(object):
                     include_globs=include_globs
                 )
                 chunk['repository'] = repo.repo_name
-                df = pd.concat([df, chunk])
+                dfs.append(chunk)
             except GitCommandError:
                 print('Warning! Repo: %s couldn\'t be inspected' % (repo, ))
 
+        df = pd.concat(dfs)
         df.reset_index()
 
         aggs = ['hour_of_day', 'day_of_week']
@@ -766,8 +745,17 @@ class ProjectDirectory(object):
         :return:
         """
 
-        for repo in self.repos:
-            repo.__del__()
+        self.cleanup()
+
+    def cleanup(self):
+        """
+        Cleans up each repository in the project directory, see Repository.cleanup. Calling it more than once is a no-op.
+
+        :return:
+        """
+
+        for repo in getattr(self, 'repos', []):
+            repo.cleanup()
 
 
 class GitHubProfile(ProjectDirectory):
@@ -16,6 +16,8 @@ import json
 import logging
 import tempfile
 import fnmatch
+import functools
+import re
 import shutil
 import warnings
 import numpy as np
@@ -33,6 +35,53 @@ except ImportError as e:
 
 __author__ = 'willmcginnis'
 
+# one header per commit for git log, NUL to start it, unit separators between fields and a record separator after the
+# (possibly multi-line) message, followed by the --numstat lines of that commit
+_COMMIT_STATS_FORMAT = '%x00%H%x1f%an%x1f%cn%x1f%ct%x1f%B%x1e'
+
+# the columns of file_change_rates, in order, whether or not there was any history to aggregate
+_FILE_CHANGE_RATES_COLUMNS = ['unique_committers', 'abs_rate_of_change', 'net_rate_of_change', 'net_change', 'abs_change',
+                              'edit_rate']
+
+
+# git quotes a path with special or non-ascii characters in its diff output, C-style and wrapped in double quotes
+_QUOTED_PATH_ESCAPE = re.compile(rb'\\([0-7]{3}|.)')
+_QUOTED_PATH_CHARS = {b'a': b'\a', b'b': b'\b', b't': b'\t', b'n': b'\n', b'v': b'\v', b'f': b'\f', b'r': b'\r'}
+
+
+def _unquote_path(path):
+    """
+    Undoes git's quoting of a path in --numstat output, so that e.g. "donn\\303\\251es.txt" becomes données.txt.
+    Paths that aren't quoted are returned as they are.
+
+    :param path: the path as git printed it
+    :return: str
+    """
+
+    if len(path) < 2 or path[0] != '"' or path[-1] != '"':
+        return path
+
+    def unescape(match):
+        escaped = match.group(1)
+        if len(escaped) == 3:
+            return bytes([int(escaped, 8)])
+        return _QUOTED_PATH_CHARS.get(escaped, escaped)
+
+    return _QUOTED_PATH_ESCAPE.sub(unescape, path[1:-1].encode('utf-8')).decode('utf-8', 'replace')
+
+
+@functools.lru_cache(maxsize=128)
+def _compile_globs(globs):
+    """
+    Compiles a tuple of globs into a single regex that matches a filename if any one of the globs does, with the same
+    semantics as fnmatch.fnmatch.
+
+    :param globs: a tuple of globs
+    :return: compiled regex
+    """
+
+    return re.compile('|'.join(fnmatch.translate(os.path.normcase(g)) for g in globs))
+
 
 def _parallel_cumulative_blame_func(self_, x, committer, ignore_globs, include_globs):
     blm = self_.blame(
@@ -87,6 +136,8 @@ class Repository(object):
             self.git_dir = os.getcwd()
             self.repo = Repo(self.git_dir)
 
+        self._closed = False
+
         if self.verbose:
             print('Repository [%s] instantiated at directory: %s' % (self._repo_name(), self.git_dir))
 
@@ -96,6 +147,21 @@ class Repository(object):
 
         :return:
         """
+        self.cleanup()
+
+    def cleanup(self):
+        """
+        Stops the git processes kept open by the underlying gitpython Repo and, if the repository was cloned into a
+        temporary location, removes the clone. Calling it more than once is a no-op, so it is safe to call explicitly
+        before the object is deleted.
+
+        :return:
+        """
+        if getattr(self, '_closed', True):
+            return
+
+        self._closed = True
+        self.repo.close()
         if self.__delete_hook:
             if os.path.exists(self.git_dir):
                 shutil.rmtree(self.git_dir)
@@ -261,50 +327,9 @@ class Repository(object):
         :return: DataFrame
         """
 
-        # setup the data-set of commits
-        if limit is None:
-            if days is None:
-                ds = [[
-                          x.author.name,
-                          x.committer.name,
-                          x.committed_date,
-                          x.message,
-                          x.hexsha,
-                          self.__check_extension(x.stats.files, ignore_globs=ignore_globs, include_globs=include_globs)
-                      ] for x in self.repo.iter_commits(branch, max_count=sys.maxsize)]
-            else:
-                ds = []
-                c_date = time.time()
-                commits = self.repo.iter_commits(branch, max_count=sys.maxsize)
-                dlim = time.time() - days * 24 * 3600
-                while c_date > dlim:
-                    try:
-                        if sys.version_info.major == 2:
-                            x = commits.next()
-                        else:
-                            x = commits.__next__()
-                    except StopIteration:
-                        break
-                    c_date = x.committed_date
-                    if c_date > dlim:
-                        ds.append([
-                            x.author.name,
-                            x.committer.name,
-                            x.committed_date,
-                            x.message,
-                            x.hexsha,
-                            self.__check_extension(x.stats.files, ignore_globs=ignore_globs,
-                                                   include_globs=include_globs)
-                        ])
-
-        else:
-            ds = [[
-                      x.author.name,
-                      x.committer.name,
-                      x.committed_date,
-                      x.message,
-                      self.__check_extension(x.stats.files, ignore_globs=ignore_globs, include_globs=include_globs)
-                  ] for x in self.repo.iter_commits(branch, max_count=limit)]
+        # setup the data-set of commits, streamed from a single git log process
+        ds = [x[:-1] + [self.__check_extension(x[-1], ignore_globs=ignore_globs, include_globs=include_globs)]
+              for x in self._iter_commit_stats(branch, limit=limit, days=days)]
 
         # aggregate stats
         ds = [x[:-1] + [sum([x[-1][key]['lines'] for key in x[-1].keys()]),
@@ -327,6 +352,27 @@ class Repository(object):
 
         return df
 
+    def count_commits(self, branch='master', limit=None, days=None):
+        """
+        Returns the number of commits in a given branch, counted by git itself (git rev-list --count) rather than by
+        building the commit history DataFrame. Unlike commit_history, no glob filtering is applied and commits that
+        touch no files (such as merges) are counted too.
+
+        :param branch: the branch to count commits for
+        :param limit: (optional, default=None) a maximum number of commits to count, None for no limit
+        :param days: (optional, default=None) only count commits from this many days back
+        :return: int
+        """
+
+        kwargs = {'count': True}
+        if limit is not None:
+            kwargs['max_count'] = limit
+        # a window reaching back past the epoch covers the whole history, so there is no cutoff to apply
+        if days is not None and time.time() - days * 24 * 3600 > 0:
+            kwargs['max_age'] = int(time.time() - days * 24 * 3600)
+
+        return int(self.repo.git.rev_list(branch, **kwargs))
+
     def file_change_history(self, branch='master', limit=None, days=None, ignore_globs=None, include_globs=None):
         """
         Returns a DataFrame of all file changes (via the commit history) for the specified branch.  This is similar to
@@ -349,52 +395,9 @@ class Repository(object):
         :return: DataFrame
         """
 
-        # setup the dataset of commits
-        if limit is None:
-            if days is None:
-                ds = [[
-                          x.author.name,
-                          x.committer.name,
-                          x.committed_date,
-                          x.message,
-                          x.name_rev.split()[0],
-                          self.__check_extension(x.stats.files, ignore_globs=ignore_globs, include_globs=include_globs)
-                      ] for x in self.repo.iter_commits(branch, max_count=sys.maxsize)]
-            else:
-                ds = []
-                c_date = time.time()
-                commits = self.repo.iter_commits(branch, max_count=sys.maxsize)
-                dlim = time.time() - days * 24 * 3600
-                while c_date > dlim:
-                    try:
-                        if sys.version_info.major == 2:
-                            x = commits.next()
-                        else:
-                            x = commits.__next__()
-                    except StopIteration:
-                        break
-
-                    c_date = x.committed_date
-                    if c_date > dlim:
-                        ds.append([
-                            x.author.name,
-                            x.committer.name,
-                            x.committed_date,
-                            x.message,
-                            x.name_rev.split()[0],
-                            self.__check_extension(x.stats.files, ignore_globs=ignore_globs,
-                                                   include_globs=include_globs)
-                        ])
-
-        else:
-            ds = [[
-                      x.author.name,
-                      x.committer.name,
-                      x.committed_date,
-                      x.message,
-                      x.name_rev.split()[0],
-                      self.__check_extension(x.stats.files, ignore_globs=ignore_globs, include_globs=include_globs)
-                  ] for x in self.repo.iter_commits(branch, max_count=limit)]
+        # setup the dataset of commits, streamed from a single git log process
+        ds = [x[:-1] + [self.__check_extension(x[-1], ignore_globs=ignore_globs, include_globs=include_globs)]
+              for x in self._iter_commit_stats(branch, limit=limit, days=days)]
 
         ds = [x[:-1] + [fn, x[-1][fn]['insertions'], x[-1][fn]['deletions']] for x in ds for fn in x[-1].keys() if
               len(x[-1].keys()) > 0]
@@ -439,12 +442,12 @@ class Repository(object):
         if fch.shape[0] > 0:
             file_history = fch.groupby('filename').agg(
                 {
-                    'insertions': [np.sum, np.max, np.mean],
-                    'deletions': [np.sum, np.max, np.mean],
+                    'insertions': ['sum', 'max', 'mean'],
+                    'deletions': ['sum', 'max', 'mean'],
                     'message': lambda x: ','.join(['"' + str(y) + '"' for y in x]),
                     'committer': lambda x: ','.join(['"' + str(y) + '"' for y in x]),
                     'author': lambda x: ','.join(['"' + str(y) + '"' for y in x]),
-                    'date': [np.max, np.min]
+                    'date': ['max', 'min']
                 }
             )
 
@@ -454,13 +457,13 @@ class Repository(object):
                 'message <lambda>': 'messages',
                 'committer <lambda>': 'committers',
                 'insertions sum': 'total_insertions',
-                'insertions amax': 'max_insertions',
+                'insertions max': 'max_insertions',
                 'insertions mean': 'mean_insertions',
                 'author <lambda>': 'authors',
-                'date amax': 'max_date',
-                'date amin': 'min_date',
+                'date max': 'max_date',
+                'date min': 'min_date',
                 'deletions sum': 'total_deletions',
-                'deletions amax': 'max_deletions',
+                'deletions max': 'max_deletions',
                 'deletions mean': 'mean_deletions'
             })
 
@@ -483,23 +486,97 @@ class Repository(object):
             file_history['unique_committers'] = file_history['committers'].map(lambda x: len(set(x.split(','))))
 
             # reindex
-            file_history = file_history.reindex(
-                columns=['unique_committers', 'abs_rate_of_change', 'net_rate_of_change', 'net_change', 'abs_change',
-                         'edit_rate'])
+            file_history = file_history.reindex(columns=_FILE_CHANGE_RATES_COLUMNS)
             file_history.sort_values(by=['edit_rate'], inplace=True)
 
             if coverage and self.has_coverage():
                 file_history = file_history.merge(self.coverage(), left_index=True, right_on='filename', how='outer')
                 file_history.set_index(keys=['filename'], drop=True, inplace=True)
         else:
-            file_history = DataFrame(
-                columns=['unique_committers', 'abs_rate_of_change', 'net_rate_of_change', 'net_change', 'abs_change',
-                         'edit_rate'])
+            file_history = DataFrame(columns=_FILE_CHANGE_RATES_COLUMNS)
 
         file_history = self._add_labels_to_df(file_history)
 
         return file_history
 
+    def _iter_commit_stats(self, branch, limit=None, days=None):
+        """
+        Internal method to stream the commits of a branch, newest first, from a single git log process rather than
+        running a diff per commit. Each commit, merges included, is diffed against its first parent, as gitpython's
+        Commit.stats does (the root commit against the empty tree), and is yielded as a list of author, committer,
+        committed date, message, sha and a dict of file stats keyed by unquoted path.
+
+        :param branch: the branch to return commits for
+        :param limit: (optional, default=None) a maximum number of commits to return, None for no limit
+        :param days: (optional, default=None) number of days to return, if limit is None
+        :return: generator
+        """
+
+        # --root and --no-show-signature override log.showRoot and log.showSignature from the user's git config, which
+        # would otherwise drop the root commit's stats or mix gpg output into the stream
+        kwargs = {
+            'diff_merges': 'first-parent',
+            'root': True,
+            'no_show_signature': True,
+            'numstat': True,
+            'no_renames': True,
+            'format': _COMMIT_STATS_FORMAT
+        }
+        if limit is not None:
+            kwargs['max_count'] = limit
+            days = None
+        dlim = time.time() - days * 24 * 3600 if days is not None else None
+        if dlim is not None and dlim <= 0:
+            # a window reaching back past the epoch covers the whole history, so no commit is compared against it
+            dlim = None
+
+        proc = self.repo.git.log(branch, '--', as_process=True, **kwargs)
+        commit = None
+        header = None
+        try:
+            for line in proc.stdout:
+                line = line.decode('utf-8', 'replace')
+                if header is None and not line.startswith('\x00'):
+                    # a --numstat line of the current commit
+                    if commit is not None and line.strip() != '':
+                        insertions, deletions, filename = line.rstrip('\n').split('\t', 2)
+                        insertions = int(insertions) if insertions != '-' else 0
+                        deletions = int(deletions) if deletions != '-' else 0
+                        commit[-1][_unquote_path(filename)] = {
+                            'insertions': insertions,
+                            'deletions': deletions,
+                            'lines': insertions + deletions
+                        }
+                    continue
+
+                header = line[1:] if header is None else header + line
+                if '\x1e' not in header:
+                    # the commit message spans more lines
+                    continue
+
+                sha, author, committer, committed_date, message = header.split('\x1e')[0].split('\x1f', 4)
+                header = None
+
+                if commit is not None:
+                    yield commit
+                    commit = None
+
+                if dlim is not None and int(committed_date) <= dlim:
+                    break
+
+                commit = [author, committer, int(committed_date), message, sha, {}]
+            else:
+                proc.wait()
+
+            if commit is not None:
+                yield commit
+        finally:
+            # stopping at the days cutoff, or a consumer that stops early, leaves git log running, so it is ended here
+            proc.stdout.close()
+            if proc.proc.poll() is None:
+                proc.proc.terminate()
+                proc.proc.wait()
+
     @staticmethod
     def __check_extension(files, ignore_globs=None, include_globs=None):
         """
@@ -511,29 +588,29 @@ class Repository(object):
         :return: dict
         """
 
+        # with nothing to include or ignore every file is kept, so there is nothing to match
+        if not include_globs and not ignore_globs:
+            return dict(files)
+
         if include_globs is None or include_globs == []:
             include_globs = ['*']
 
+        include = _compile_globs(tuple(include_globs))
+        exclude = _compile_globs(tuple(ignore_globs)) if ignore_globs else None
+
         out = {}
         for key in files.keys():
-            # count up the number of patterns in the ignore globs list that match
-            if ignore_globs is not None:
-                count_exclude = sum([1 if fnmatch.fnmatch(key, g) else 0 for g in ignore_globs])
-            else:
-                count_exclude = 0
-
-            # count up the number of patterns in the include globs list that match
-            count_include = sum([1 if fnmatch.fnmatch(key, g) else 0 for g in include_globs])
+            name = os.path.normcase(key)
 
-            # if we have one vote or more to include and none to exclude, then we use the file.
-            if count_include > 0 and count_exclude == 0:
+            # if the file matches one of the include globs and none of the ignore globs, then we use the file.
+            if include.match(name) and (exclude is None or not exclude.match(name)):
                 out[key] = files[key]
 
         return out
 
     @multicache(
         key_prefix='blame',
-        key_list=['rev', 'committer', 'by', 'ignore_blobs', 'include_globs'],
+        key_list=['rev', 'committer', 'by', 'ignore_globs', 'include_globs'],
         skip_if=lambda x: True if x.get('rev') is None or x.get('rev') == 'HEAD' else False
     )
     def blame(self, rev='HEAD', committer=True, by='repository', ignore_globs=None, include_globs=None):
@@ -560,9 +637,10 @@ class Repository(object):
         for file in self.__check_extension({x: x for x in file_names}, ignore_globs=ignore_globs,
                                            include_globs=include_globs).keys():
             try:
+                # incremental blame only streams line ranges and commit headers, so file contents are never decoded
                 blames.append(
-                    [x + [str(file).replace(self.git_dir + '/', '')] for x in
-                     self.repo.blame(rev, str(file).replace(self.git_dir + '/', ''))]
+                    [[x.commit, len(x.linenos), str(file).replace(self.git_dir + '/', '')] for x in
+                     self.repo.blame_incremental(rev, str(file).replace(self.git_dir + '/', ''))]
                 )
             except GitCommandError:
                 pass
@@ -571,23 +649,23 @@ class Repository(object):
         if committer:
             if by == 'repository':
                 blames = DataFrame(
-                    [[x[0].committer.name, len(x[1])] for x in blames],
+                    [[x[0].committer.name, x[1]] for x in blames],
                     columns=['committer', 'loc']
                 ).groupby('committer').agg({'loc': np.sum})
             elif by == 'file':
                 blames = DataFrame(
-                    [[x[0].committer.name, len(x[1]), x[2]] for x in blames],
+                    [[x[0].committer.name, x[1], x[2]] for x in blames],
                     columns=['committer', 'loc', 'file']
                 ).groupby(['committer', 'file']).agg({'loc': np.sum})
         else:
             if by == 'repository':
                 blames = DataFrame(
-                    [[x[0].author.name, len(x[1])] for x in blames],
+                    [[x[0].author.name, x[1]] for x in blames],
                     columns=['author', 'loc']
                 ).groupby('author').agg({'loc': np.sum})
             elif by == 'file':
                 blames = DataFrame(
-                    [[x[0].author.name, len(x[1]), x[2]] for x in blames],
+                    [[x[0].author.name, x[1], x[2]] for x in blames],
                     columns=['author', 'loc', 'file']
                 ).groupby(['author', 'file']).agg({'loc': np.sum})
 
@@ -611,7 +689,7 @@ class Repository(object):
         """
 
         if limit is None and skip is None and num_datapoints is not None:
-            limit = sum(1 for _ in self.repo.iter_commits())
+            limit = self.count_commits(branch=branch)
             skip = int(float(limit) / num_datapoints)
         else:
             if limit is None:
@@ -688,20 +766,11 @@ class Repository(object):
         revs.set_index(keys=['date'], drop=True, inplace=True)
         revs = revs.fillna(0.0)
 
-        # drop 0 cols
-        for col in revs.columns.values:
-            if col != 'col':
-                if revs[col].sum() == 0:
-                    del revs[col]
-
-        # drop 0 rows
-        keep_idx = []
-        committers = [x for x in revs.columns.values if x != 'date']
-        for idx, row in revs.iterrows():
-            if sum([row[x] for x in committers]) > 0:
-                keep_idx.append(idx)
-
-        revs = revs.loc[keep_idx]
+        # drop 0 cols, then 0 rows
+        committers = [x for x in revs.columns.values if x not in ['date', 'repository']]
+        totals = revs[committers].sum()
+        revs = revs.drop(columns=totals.index[totals == 0])
+        revs = revs[revs[totals.index[totals != 0]].sum(axis=1) > 0]
 
         return revs
 
@@ -747,20 +816,11 @@ class Repository(object):
         revs.set_index(keys=['date'], drop=True, inplace=True)
         revs = revs.fillna(0.0)
 
-        # drop 0 cols
-        for col in revs.columns.values:
-            if col != 'col':
-                if revs[col].sum() == 0:
-                    del revs[col]
-
-        # drop 0 rows
-        keep_idx = []
-        committers = [x for x in revs.columns.values if x != 'date']
-        for idx, row in revs.iterrows():
-            if sum([row[x] for x in committers]) > 0:
-                keep_idx.append(idx)
-
-        revs = revs.iloc[keep_idx]
+        # drop 0 cols, then 0 rows
+        committers = [x for x in revs.columns.values if x not in ['date', 'repository']]
+        totals = revs[committers].sum()
+        revs = revs.drop(columns=totals.index[totals == 0])
+        revs = revs[revs[totals.index[totals != 0]].sum(axis=1) > 0]
         revs.sort_index(ascending=False, inplace=True)
 
         return revs
@@ -981,13 +1041,14 @@ class Repository(object):
         :returns: str
         """
 
-        if self._git_repo_name is not None:
-            return self._git_repo_name
-        else:
+        if self._git_repo_name is None:
+            # the directory name doesn't change, so it is resolved once and kept for every DataFrame labelled with it
             reponame = self.repo.git_dir.split(os.sep)[-2]
             if reponame.strip() == '':
-                return 'unknown_repo'
-            return reponame
+                reponame = 'unknown_repo'
+            self._git_repo_name = reponame
+
+        return self._git_repo_name
 
     def _add_labels_to_df(self, df):
         df['repository'] = self._repo_name()
@@ -1054,9 +1115,9 @@ class Repository(object):
             else:
                 cm = 'author'
 
-            blame = self.repo.blame(rev, os.path.join(self.git_dir, filename))
-            blame = DataFrame([[x[0].committer.name, len(x[1])] for x in blame], columns=[cm, 'loc']).groupby(cm).agg(
-                {'loc': np.sum})
+            blame = self.repo.blame_incremental(rev, os.path.join(self.git_dir, filename))
+            blame = DataFrame([[x.commit.committer.name, len(x.linenos)] for x in blame], columns=[cm, 'loc']).groupby(
+                cm).agg({'loc': np.sum})
             if blame.shape[0] > 0:
                 return blame['loc'].idxmax()
             else:
@@ -1113,8 +1174,10 @@ class Repository(object):
         df = df.groupby('file').agg({'loc': np.sum})
         df = df.reset_index(level=-1)
 
-        # map in file owners
-        df['file_owner'] = df['file'].map(lambda x: self.file_owner(rev, x, committer=committer))
+        # map in file owners, whoever is blamed for the most lines of each file, from the blame we already have
+        cm = 'committer' if committer else 'author'
+        owners = blame.loc[blame.groupby('file')['loc'].idxmax()].set_index('file')[cm]
+        df['file_owner'] = df['file'].map(owners)
 
         # add extension (something like the language)
         df['ext'] = df['file'].map(lambda x: x.split('.')[-1])
@@ -1160,8 +1223,8 @@ class Repository(object):
         )
 
         # add in the date fields
-        ch['day_of_week'] = ch.index.map(lambda x: x.weekday())
-        ch['hour_of_day'] = ch.index.map(lambda x: x.hour)
+        ch['day_of_week'] = ch.index.weekday.astype('int64')
+        ch['hour_of_day'] = ch.index.hour.astype('int64')
 
         aggs = ['hour_of_day', 'day_of_week']
         if by is not None:
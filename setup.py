@@ -25,6 +25,7 @@ setup(
     ],
     keywords='git pandas data analysis',
     packages=find_packages(exclude=['tests*']),
+    python_requires='>=3.6',
     include_package_data=True,
     author='Will McGinnis',
     install_requires=[
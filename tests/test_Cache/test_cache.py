@@ -0,0 +1,327 @@
+import sys
+import zlib
+import pickle
+import fnmatch
+import unittest
+import threading
+from unittest import mock
+import pandas as pd
+from gitpandas.cache import EphemeralCache, RedisDFCache, CacheMissException, _cache_key, _HAS_REDIS
+
+__author__ = 'willmcginnis'
+
+
+class _FakeRedis(object):
+    """
+    Just enough of a redis client for RedisDFCache, backed by a dictionary. Keys are stored as bytes, the way redis
+    returns them.
+
+    """
+
+    def __init__(self, decode_responses=False, **kwargs):
+        self.decode_responses = decode_responses
+        self.store = dict()
+        self.ttls = dict()
+        self.deletes = []
+        self.scans = []
+
+    @staticmethod
+    def _bytes(k):
+        return k.encode('utf-8') if isinstance(k, str) else k
+
+    def set(self, k, v, ex=None):
+        self.store[self._bytes(k)] = v
+        self.ttls[self._bytes(k)] = ex
+
+    def get(self, k):
+        return self.store.get(self._bytes(k))
+
+    def exists(self, k):
+        return int(self._bytes(k) in self.store)
+
+    def delete(self, *keys):
+        self.deletes.append(keys)
+        return sum(self.store.pop(self._bytes(k), None) is not None for k in keys)
+
+    def scan_iter(self, match=None, count=None):
+        self.scans.append((match, count))
+        keys = [k for k in list(self.store) if match is None or fnmatch.fnmatchcase(k.decode('utf-8'), match)]
+        return iter([k.decode('utf-8') for k in keys] if self.decode_responses else keys)
+
+
+class TestEphemeralCache(unittest.TestCase):
+    def test_set_get(self):
+        cache = EphemeralCache()
+        cache.set('key1', 'value1')
+        self.assertEqual(cache.get('key1'), 'value1')
+
+    def test_miss(self):
+        cache = EphemeralCache()
+        with self.assertRaises(CacheMissException):
+            cache.get('key1')
+
+    def test_exists(self):
+        cache = EphemeralCache(max_keys=2)
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+        self.assertTrue(cache.exists('key1'))
+        self.assertFalse(cache.exists('key3'))
+
+        # checking for a key doesn't count as using it
+        self.assertEqual(list(cache._cache), ['key1', 'key2'])
+
+    def test_eviction(self):
+        cache = EphemeralCache(max_keys=2)
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+
+        # reading key1 makes key2 the least recently used, so it is the one evicted
+        cache.get('key1')
+        cache.set('key3', 'value3')
+        self.assertEqual(list(cache._cache), ['key1', 'key3'])
+
+        # overwriting a key refreshes it rather than adding another entry
+        cache.set('key1', 'value4')
+        self.assertEqual(list(cache._cache), ['key3', 'key1'])
+        self.assertEqual(cache.get('key1'), 'value4')
+
+    def test_evict_empty(self):
+        cache = EphemeralCache()
+        cache.set('key1', 'value1')
+        cache.evict(3)
+        cache.evict()
+        self.assertEqual(len(cache._cache), 0)
+
+    def test_threads(self):
+        # switching threads as often as possible makes any race between them show up within a short run
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        for admission in [None, 'tinylfu']:
+            with self.subTest(admission=admission):
+                cache = EphemeralCache(max_keys=4, admission=admission)
+                errors = []
+
+                def use(offset):
+                    try:
+                        for idx in range(5000):
+                            key = 'key%d' % ((idx + offset) % 8, )
+                            if not cache.exists(key):
+                                cache.set(key, idx)
+                            try:
+                                cache.get(key)
+                            except CacheMissException:
+                                pass
+                    except Exception as e:
+                        errors.append(e)
+
+                # gets and sets from several threads, with keys evicted all the while, only ever miss
+                threads = [threading.Thread(target=use, args=(offset, )) for offset in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(errors, [])
+                self.assertLessEqual(len(cache._cache), 4)
+
+    def test_tinylfu_admission(self):
+        hot = ['hot_%d' % (idx, ) for idx in range(3)]
+        for admission in [None, 'tinylfu']:
+            with self.subTest(admission=admission):
+                cache = EphemeralCache(max_keys=3, admission=admission)
+                for key in hot:
+                    cache.set(key, key)
+                    for _ in range(5):
+                        cache.get(key)
+
+                # a scan over more keys than the cache holds, each used once
+                for idx in range(100):
+                    cache.set('cold_%d' % (idx, ), idx)
+
+                # the scan flushes a plain LRU cache, but with tinylfu the hot keys are kept
+                self.assertEqual(all(cache.exists(key) for key in hot), admission == 'tinylfu')
+                self.assertEqual(len(cache._cache), 3)
+
+    def test_unknown_admission(self):
+        with self.assertRaises(ValueError):
+            EphemeralCache(admission='lirs')
+
+
+class TestCacheKey(unittest.TestCase):
+    def test_cache_key(self):
+        key = _cache_key('blame', 'repository1', ('rev', 'ignore_globs'), {'rev': 'abc', 'ignore_globs': ['*.md']})
+        self.assertEqual(key, "blamerepository1abc_['*.md']")
+
+        # arguments that aren't keyed don't change the key, and missing ones are keyed as None
+        self.assertEqual(_cache_key('blame', 'repository1', ('rev', ), {'rev': 'abc', 'committer': True}),
+                         'blamerepository1abc')
+        self.assertEqual(_cache_key('blame', 'repository1', ('rev', ), {}), 'blamerepository1None')
+
+
+@unittest.skipUnless(_HAS_REDIS, 'redis is not installed')
+class TestRedisDFCache(unittest.TestCase):
+    """
+    Runs RedisDFCache against an in-memory stand-in for the redis client, so no server is needed.
+
+    """
+
+    def setUp(self):
+        self.fake = _FakeRedis()
+        patcher = mock.patch('gitpandas.cache.redis.StrictRedis', return_value=self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_set_get(self):
+        cache = RedisDFCache(ttl=60)
+        df = pd.DataFrame({'loc': [1, 2], 'committer': ['a', 'b']})
+        cache.set('key1', df)
+        self.assertTrue(cache.get('key1').equals(df))
+        self.assertTrue(cache.exists('key1'))
+
+        # stored once, under a hashed key after the prefix, with the ttl
+        key = cache._key('key1')
+        self.assertEqual(list(self.fake.store), [key])
+        self.assertTrue(key.startswith(b'gitpandas_'))
+        self.assertEqual(len(key), len(b'gitpandas_') + 32)
+        self.assertEqual(self.fake.ttls[key], 60)
+
+    def test_value_format(self):
+        cache = RedisDFCache()
+        values = {'none': None, 'dict': {'a': [1, 2]}, 'series': pd.Series([1.5, 2.5], name='loc')}
+        for key, value in values.items():
+            cache.set(key, value)
+
+        # anything picklable round trips, and is stored as a compressed pickle
+        self.assertIsNone(cache.get('none'))
+        self.assertEqual(cache.get('dict'), {'a': [1, 2]})
+        self.assertTrue(cache.get('series').equals(values['series']))
+        self.assertEqual(pickle.loads(zlib.decompress(self.fake.store[cache._key('dict')])), {'a': [1, 2]})
+
+    def test_get_single_round_trip(self):
+        cache = RedisDFCache()
+        cache.set('key1', 'value1')
+
+        # a hit and a miss are each one GET, without an EXISTS first
+        with mock.patch.object(self.fake, 'exists') as exists:
+            with mock.patch.object(self.fake, 'get', wraps=self.fake.get) as get:
+                self.assertEqual(cache.get('key1'), 'value1')
+                with self.assertRaises(CacheMissException):
+                    cache.get('key2')
+        self.assertEqual(get.call_count, 2)
+        exists.assert_not_called()
+
+    def test_key(self):
+        cache = RedisDFCache()
+        long_key = 'blame' + '/a/long/repository/path' * 50 + "_['*.md', '*.rst']"
+
+        # keys of any length hash to the same size, the same way from one cache to the next, and don't collide
+        self.assertEqual(len(cache._key(long_key)), len(cache._key('key1')))
+        self.assertEqual(cache._key(long_key), RedisDFCache()._key(long_key))
+        self.assertNotEqual(cache._key(long_key), cache._key(long_key + 'x'))
+
+        cache.set(long_key, 'value1')
+        self.assertEqual(cache.get(long_key), 'value1')
+
+    def test_miss(self):
+        cache = RedisDFCache()
+        self.assertFalse(cache.exists('key1'))
+        with self.assertRaises(CacheMissException):
+            cache.get('key1')
+
+        # a key that expired in redis is dropped from the tracked keys when it misses
+        cache.set('key1', 'value1')
+        self.fake.store.clear()
+        with self.assertRaises(CacheMissException):
+            cache.get('key1')
+        self.assertEqual(list(cache._key_list), [])
+
+    def test_eviction(self):
+        cache = RedisDFCache(max_keys=2)
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+
+        # setting key1 again makes key2 the oldest, so it is the one evicted
+        cache.set('key1', 'value3')
+        cache.set('key3', 'value3')
+        self.assertEqual(list(cache._key_list), [cache._key('key1'), cache._key('key3')])
+        self.assertEqual(set(self.fake.store), {cache._key('key1'), cache._key('key3')})
+        with self.assertRaises(CacheMissException):
+            cache.get('key2')
+
+    def test_key_tracking(self):
+        cache = RedisDFCache(max_keys=3)
+        for _ in range(3):
+            cache.set('key1', 'value1')
+            cache.set('key2', 'value2')
+
+        # setting a tracked key again doesn't add it twice, so neither key counts against max_keys more than once
+        self.assertEqual(list(cache._key_list), [cache._key('key1'), cache._key('key2')])
+        self.assertIn(cache._key('key1'), cache._key_list)
+        self.assertNotIn(cache._key('key3'), cache._key_list)
+        self.assertEqual(self.fake.deletes, [])
+
+    def test_batched_delete(self):
+        cache = RedisDFCache(max_keys=5)
+        for idx in range(5):
+            cache.set('key%d' % (idx, ), idx)
+
+        # evicting several keys at once, and purging, each take a single DEL
+        cache.evict(3)
+        self.assertEqual(self.fake.deletes, [tuple(cache._key('key%d' % (idx, )) for idx in range(3))])
+        cache.purge()
+        self.assertEqual(len(self.fake.deletes), 2)
+        self.assertEqual(set(self.fake.deletes[1]), {cache._key('key3'), cache._key('key4')})
+
+        # nothing left to delete sends nothing
+        cache.evict(2)
+        cache.purge()
+        self.assertEqual(len(self.fake.deletes), 2)
+
+    def test_sync(self):
+        RedisDFCache().set('key1', 'value1')
+        self.fake.set('other_key', 'value')
+
+        # a new cache picks up the existing keys with the prefix, and setting one again doesn't track it twice
+        cache = RedisDFCache()
+        self.assertEqual(list(cache._key_list), [cache._key('key1')])
+        self.assertEqual(self.fake.scans[-1], ('gitpandas_*', 1000))
+        cache.set('key1', 'value2')
+        self.assertEqual(list(cache._key_list), [cache._key('key1')])
+        self.assertEqual(cache.get('key1'), 'value2')
+
+    def test_sync_decoded_keys(self):
+        # a client made with decode_responses returns str keys from SCAN, which are tracked as bytes like any other
+        self.fake.decode_responses = True
+        RedisDFCache().set('key1', 'value1')
+        cache = RedisDFCache(max_keys=1)
+        self.assertEqual(list(cache._key_list), [cache._key('key1')])
+
+        cache.set('key1', 'value2')
+        self.assertEqual(list(cache._key_list), [cache._key('key1')])
+        self.assertEqual(self.fake.deletes, [])
+
+    def test_purge(self):
+        cache = RedisDFCache()
+        cache.set('key1', 'value1')
+        cache.set('key2', 'value2')
+        self.fake.set('other_key', 'value')
+
+        cache.purge()
+        self.assertEqual(list(self.fake.store), [b'other_key'])
+        self.assertEqual(list(cache._key_list), [])
+
+    def test_threads(self):
+        cache = RedisDFCache(max_keys=10)
+
+        def use(offset):
+            for idx in range(offset, 50, 5):
+                cache.set('key%d' % (idx, ), idx)
+
+        threads = [threading.Thread(target=use, args=(offset, )) for offset in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # the tracked keys stay within max_keys and match what is stored, however the sets interleave
+        self.assertEqual(len(cache._key_list), 10)
+        self.assertEqual(set(cache._key_list), set(self.fake.store))
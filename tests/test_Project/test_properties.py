@@ -2,12 +2,20 @@ import os
 import unittest
 import shutil
 import time
-import git
 from gitpandas import ProjectDirectory
+from tests.utils import build_repo_fast_import, make_fixture_dir, REMOTE_TESTS
+
+try:
+    from joblib import delayed, Parallel
+
+    _has_joblib = True
+except ImportError as e:
+    _has_joblib = False
 
 __author__ = 'willmcginnis'
 
 
+@unittest.skipUnless(REMOTE_TESTS, 'set GITPANDAS_REMOTE_TESTS=1 to run tests that need network access')
 class TestProperties(unittest.TestCase):
     """
     For now this is using the git-python repo for tests. This probably isn't a great idea, we should really
@@ -19,109 +27,87 @@ class TestProperties(unittest.TestCase):
         self.projectd = ProjectDirectory(working_dir=['git://github.com/wdm0006/git-pandas.git'], verbose=True)
 
     def tearDown(self):
-        self.projectd.__del__()
+        self.projectd.cleanup()
 
     def test_repo_name(self):
-        self.assertIn('git-pandas', list(self.projectd.repo_name()['repository'].values))
+        self.assertIn('git-pandas', set(self.projectd.repo_name()['repository'].values))
 
     def test_branches(self):
-        branches = list(self.projectd.branches()['branch'].values)
-        self.assertIn('master', branches)
-        self.assertIn('gh-pages', branches)
+        branches = set(self.projectd.branches()['branch'].values)
+        self.assertTrue({'master', 'gh-pages'} <= branches)
 
     def test_tags(self):
-        tags = list(self.projectd.tags()['tag'].values)
-        self.assertIn('0.0.1', tags)
-        self.assertIn('0.0.2', tags)
+        tags = set(self.projectd.tags()['tag'].values)
+        self.assertTrue({'0.0.1', '0.0.2'} <= tags)
 
     def test_is_bare(self):
-        for x in self.projectd.is_bare()['is_bare'].values:
-            self.assertFalse(x)
+        self.assertFalse(self.projectd.is_bare()['is_bare'].any())
 
 
 class TestLocalProperties(unittest.TestCase):
     """
+    The tests in this class only read from the repositories, so they and the project directories over them are built
+    once for the class.
 
     """
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         """
 
         :return:
         """
-        project_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos'
-        repo1_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos' + os.sep + 'repository1'
-        repo2_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos' + os.sep + 'repository2'
-
-        if os.path.exists(project_dir):
-            shutil.rmtree(project_dir)
-
-        os.makedirs(project_dir)
-
-        if not os.path.exists(repo1_dir):
-            os.makedirs(repo1_dir)
-
-        if not os.path.exists(repo2_dir):
-            os.makedirs(repo2_dir)
-
-        # create an empty repo (but not bare)
-        grepo1 = git.Repo.init(repo1_dir)
-        grepo2 = git.Repo.init(repo2_dir)
-
-        # add a file
-        with open(repo1_dir + os.sep + 'README.md', 'w') as f:
-            f.write('Sample README for a sample python project\n')
+        project_dir = make_fixture_dir()
+        repo1_dir = project_dir + os.sep + 'repository1'
+        repo2_dir = project_dir + os.sep + 'repository2'
 
-        # add a file
-        with open(repo2_dir + os.sep + 'README.md', 'w') as f:
-            f.write('Sample README for a sample js project\n')
+        os.makedirs(repo1_dir)
+        os.makedirs(repo2_dir)
 
-        # commit them
-        grepo1.git.add('README.md')
-        grepo1.git.commit(m='first commit')
+        # a README in each, then one source file per commit, dated two seconds apart with the second repository's
+        # files committed after the first's. Each repository's history is written by a single git fast-import process.
+        commit_date = int(time.time()) - 600
+        commits1 = [('first commit', {'README.md': 'Sample README for a sample python project\n'}, commit_date)]
+        commits2 = [('first commit', {'README.md': 'Sample README for a sample js project\n'}, commit_date)]
 
-        grepo2.git.add('README.md')
-        grepo2.git.commit(m='first commit')
-
-        # now add some other files:
         for idx in range(5):
-            with open(repo1_dir + os.sep + 'file_%d.py' % (idx, ), 'w') as f:
-                f.write('import sys\nimport os\n')
-
-            time.sleep(2.0)
-            grepo1.git.add(all=True)
-            grepo1.git.commit(m=' "adding file_%d.py"' % (idx, ))
+            commit_date += 2
+            commits1.append(('adding file_%d.py' % (idx, ), {'file_%d.py' % (idx, ): 'import sys\nimport os\n'},
+                             commit_date))
 
-        # now add some other files:
         for idx in range(5):
-            with open(repo2_dir + os.sep + 'file_%d.js' % (idx, ), 'w') as f:
-                f.write('document.write("hello world!");\n')
-
-            time.sleep(2.0)
-            grepo2.git.add(all=True)
-            grepo2.git.commit(m=' "adding file_%d.js"' % (idx, ))
-
-        self.projectd_1 = ProjectDirectory(working_dir=[repo1_dir, repo2_dir], verbose=True)
-        self.projectd_2 = ProjectDirectory(working_dir=project_dir, verbose=True)
-
-    def tearDown(self):
-        self.projectd_1.__del__()
-        self.projectd_2.__del__()
-        project_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos'
-        shutil.rmtree(project_dir)
+            commit_date += 2
+            content = 'document.write("hello world!");\n'
+            commits2.append(('adding file_%d.js' % (idx, ), {'file_%d.js' % (idx, ): content}, commit_date))
+
+        # the two imports are independent, so where joblib is available they run side by side
+        if _has_joblib:
+            Parallel(n_jobs=2, backend='threading', verbose=0)(
+                delayed(build_repo_fast_import)
+                (repo_dir, commits) for repo_dir, commits in [(repo1_dir, commits1), (repo2_dir, commits2)]
+            )
+        else:
+            build_repo_fast_import(repo1_dir, commits1)
+            build_repo_fast_import(repo2_dir, commits2)
+
+        cls.project_dir = project_dir
+        cls.projectd_1 = ProjectDirectory(working_dir=[repo1_dir, repo2_dir])
+        cls.projectd_2 = ProjectDirectory(working_dir=project_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.projectd_1.cleanup()
+        cls.projectd_2.cleanup()
+        shutil.rmtree(cls.project_dir, ignore_errors=True)
 
     def test_repo_name(self):
-        self.assertIn('repository1', list(self.projectd_1.repo_name()['repository'].values))
-        self.assertIn('repository2', list(self.projectd_1.repo_name()['repository'].values))
-        self.assertIn('repository1', list(self.projectd_2.repo_name()['repository'].values))
-        self.assertIn('repository2', list(self.projectd_2.repo_name()['repository'].values))
+        for projectd in [self.projectd_1, self.projectd_2]:
+            repo_names = set(projectd.repo_name()['repository'].values)
+            self.assertTrue({'repository1', 'repository2'} <= repo_names)
 
     def test_branches(self):
-        branches = list(self.projectd_1.branches()['branch'].values)
-        self.assertIn('master', branches)
-
-        branches = list(self.projectd_2.branches()['branch'].values)
-        self.assertIn('master', branches)
+        self.assertIn('master', set(self.projectd_1.branches()['branch'].values))
+        self.assertIn('master', set(self.projectd_2.branches()['branch'].values))
 
     def test_tags(self):
         tags = self.projectd_1.tags()
@@ -131,13 +117,8 @@ class TestLocalProperties(unittest.TestCase):
         self.assertEqual(len(tags), 0)
 
     def test_is_bare(self):
-        bares = self.projectd_1.is_bare()['is_bare'].values
-        for bare in bares:
-            self.assertFalse(bare)
-
-        bares = self.projectd_2.is_bare()['is_bare'].values
-        for bare in bares:
-            self.assertFalse(bare)
+        self.assertFalse(self.projectd_1.is_bare()['is_bare'].any())
+        self.assertFalse(self.projectd_2.is_bare()['is_bare'].any())
 
     def test_commit_history(self):
         ch = self.projectd_1.commit_history(branch='master')
@@ -176,9 +157,7 @@ class TestLocalProperties(unittest.TestCase):
         self.assertEqual(fcr['net_change'].sum(), 17)
 
         # we know this repo doesnt have coverage
-        coverages = self.projectd_1.has_coverage()['has_coverage'].values
-        for coverage in coverages:
-            self.assertFalse(coverage)
+        self.assertFalse(self.projectd_1.has_coverage()['has_coverage'].any())
 
         # we know this repo only has one committer
         bf = self.projectd_1.bus_factor(by='projectd')
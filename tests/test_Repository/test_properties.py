@@ -3,36 +3,41 @@ import time
 import shutil
 import unittest
 from gitpandas import Repository
+from gitpandas.cache import EphemeralCache
+from tests.utils import build_repo_fast_import, make_fixture_dir, REMOTE_TESTS
 import git
 
 __author__ = 'willmcginnis'
 
 
+@unittest.skipUnless(REMOTE_TESTS, 'set GITPANDAS_REMOTE_TESTS=1 to run tests that need network access')
 class TestRemoteProperties(unittest.TestCase):
     """
     For now this is using the git-python repo for tests. This probably isn't a great idea, we should really
     be either mocking the git portion, or have a known static repo in this directory to work with.
 
+    The tests only read from the clone, so it is made once for the class.
+
     """
 
-    def setUp(self):
-        self.repo = Repository(working_dir='git://github.com/wdm0006/git-pandas.git', verbose=True)
+    @classmethod
+    def setUpClass(cls):
+        cls.repo = Repository(working_dir='git://github.com/wdm0006/git-pandas.git', verbose=True)
 
-    def tearDown(self):
-        self.repo.__del__()
+    @classmethod
+    def tearDownClass(cls):
+        cls.repo.cleanup()
 
     def test_repo_name(self):
         self.assertEqual(self.repo.repo_name, 'git-pandas')
 
     def test_branches(self):
-        branches = list(self.repo.branches()['branch'].values)
-        self.assertIn('master', branches)
-        self.assertIn('gh-pages', branches)
+        branches = set(self.repo.branches()['branch'].values)
+        self.assertTrue({'master', 'gh-pages'} <= branches)
 
     def test_tags(self):
-        tags = list(self.repo.tags()['tag'].values)
-        self.assertIn('0.0.1', tags)
-        self.assertIn('0.0.2', tags)
+        tags = set(self.repo.tags()['tag'].values)
+        self.assertTrue({'0.0.1', '0.0.2'} <= tags)
 
     def test_is_bare(self):
         self.assertFalse(self.repo.is_bare())
@@ -40,58 +45,48 @@ class TestRemoteProperties(unittest.TestCase):
 
 class TestLocalProperties(unittest.TestCase):
     """
+    The tests in this class only read from the repository, so it is built once for the class and the frames that
+    several tests inspect are computed once up front.
 
     """
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
         """
 
         :return:
         """
-        project_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos'
-        repo_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos' + os.sep + 'repository1'
-
-        if os.path.exists(project_dir):
-            shutil.rmtree(project_dir)
-
-        os.makedirs(project_dir)
-
-        if not os.path.exists(repo_dir):
-            os.makedirs(repo_dir)
-
-        # create an empty repo (but not bare)
-        grepo = git.Repo.init(repo_dir)
+        cls.project_dir = make_fixture_dir()
+        repo_dir = cls.project_dir + os.sep + 'repository1'
 
-        # add a file
-        with open(repo_dir + os.sep + 'README.md', 'w') as f:
-            f.write('Sample README for a sample project\n')
+        os.makedirs(repo_dir)
 
-        # commit it
-        grepo.git.add('README.md')
-        grepo.git.commit(m='first commit')
-
-        # now add some other files:
+        # a README, then one python file per commit, dated two seconds apart
+        commit_date = int(time.time()) - 600
+        commits = [('first commit', {'README.md': 'Sample README for a sample project\n'}, commit_date)]
         for idx in range(5):
-            with open(repo_dir + os.sep + 'file_%d.py' % (idx, ), 'w') as f:
-                f.write('import sys\nimport os\n')
+            commit_date += 2
+            commits.append(('adding file_%d.py' % (idx, ), {'file_%d.py' % (idx, ): 'import sys\nimport os\n'},
+                            commit_date))
+
+        build_repo_fast_import(repo_dir, commits)
 
-            time.sleep(2.0)
-            grepo.git.add(all=True)
-            grepo.git.commit(m='adding file_%d.py' % (idx, ))
+        cls.repo = Repository(working_dir=repo_dir)
 
-        self.repo = Repository(working_dir=repo_dir, verbose=True)
+        cls.commit_history = cls.repo.commit_history(branch='master')
+        cls.file_change_history = cls.repo.file_change_history(branch='master')
+        cls.revs = cls.repo.revs()
 
-    def tearDown(self):
-        self.repo.__del__()
-        project_dir = str(os.path.dirname(os.path.abspath(__file__))) + os.sep + 'repos'
-        shutil.rmtree(project_dir)
+    @classmethod
+    def tearDownClass(cls):
+        cls.repo.cleanup()
+        shutil.rmtree(cls.project_dir, ignore_errors=True)
 
     def test_repo_name(self):
         self.assertEqual(self.repo.repo_name, 'repository1')
 
     def test_branches(self):
-        branches = list(self.repo.branches()['branch'].values)
-        self.assertIn('master', branches)
+        self.assertIn('master', set(self.repo.branches()['branch'].values))
 
     def test_tags(self):
         tags = self.repo.tags()
@@ -100,54 +95,206 @@ class TestLocalProperties(unittest.TestCase):
     def test_is_bare(self):
         self.assertFalse(self.repo.is_bare())
 
+    def test_cleanup(self):
+        repo = Repository(working_dir=self.repo.git_dir)
+        repo.cleanup()
+        repo.cleanup()
+
+        # a local repository is left in place, only temporary clones are removed
+        self.assertTrue(os.path.exists(self.repo.git_dir))
+
+    def test_cumulative_blame_cache(self):
+        cache = EphemeralCache()
+        repo = Repository(working_dir=self.repo.git_dir, cache_backend=cache)
+        cblame = repo.cumulative_blame()
+
+        # every rev's blame is now cached, so a repeat call is served without re-blaming
+        num_revs = self.revs.shape[0]
+        self.assertEqual(len(cache._cache), num_revs)
+        self.assertTrue(cblame.equals(repo.cumulative_blame()))
+        self.assertEqual(len(cache._cache), num_revs)
+
     def test_commit_history(self):
-        ch = self.repo.commit_history(branch='master')
-        self.assertEqual(ch.shape[0], 6)
+        self.assertEqual(self.commit_history.shape[0], 6)
 
         ch2 = self.repo.commit_history(branch='master', ignore_globs=['*.[!p][!y]'])
         self.assertEqual(ch2.shape[0], 5)
 
-        ch3 = self.repo.commit_history(branch='master', limit=3)
-        self.assertEqual(ch3.shape[0], 3)
+        ch3 = self.repo.commit_history(branch='master', include_globs=['*.xyz', 'file_*.py'])
+        self.assertEqual(ch3.shape[0], 5)
 
-        ch4 = self.repo.commit_history(branch='master', days=5)
-        self.assertEqual(ch4.shape[0], 6)
+        ch4 = self.repo.commit_history(branch='master', include_globs=['*.nonexistent', 'impossible_pattern_*'])
+        self.assertEqual(ch4.shape[0], 0)
 
-        fch = self.repo.file_change_history(branch='master')
-        self.assertEqual(fch.shape[0], 6)
+    def test_commit_history_limit(self):
+        for limit in [1, 3, 6]:
+            with self.subTest(limit=limit):
+                ch = self.repo.commit_history(branch='master', limit=limit)
+                self.assertEqual(ch.shape[0], limit)
+
+    def test_commit_history_days(self):
+        for days in [1, 5, 365000]:
+            with self.subTest(days=days):
+                ch = self.repo.commit_history(branch='master', days=days)
+                self.assertEqual(ch.shape[0], 6)
+
+    def test_count_commits(self):
+        self.assertEqual(self.repo.count_commits(branch='master'), self.commit_history.shape[0])
+
+        for limit in [0, 1, 3]:
+            with self.subTest(limit=limit):
+                self.assertEqual(self.repo.count_commits(branch='master', limit=limit), limit)
+
+        for days in [5, 365000]:
+            with self.subTest(days=days):
+                self.assertEqual(self.repo.count_commits(branch='master', days=days), 6)
+
+    def test_file_change_history(self):
+        self.assertEqual(self.file_change_history.shape[0], 6)
 
         fch2 = self.repo.file_change_history(branch='master', ignore_globs=['*.[!p][!y]'])
         self.assertEqual(fch2.shape[0], 5)
 
-        fch3 = self.repo.file_change_history(branch='master', limit=3)
-        self.assertEqual(fch3.shape[0], 3)
+        for limit in [1, 3, 6]:
+            with self.subTest(limit=limit):
+                fch3 = self.repo.file_change_history(branch='master', limit=limit)
+                self.assertEqual(fch3.shape[0], limit)
 
+    def test_file_change_rates(self):
         fcr = self.repo.file_change_rates(branch='master')
         self.assertEqual(fcr.shape[0], 6)
         self.assertEqual(fcr['unique_committers'].sum(), 6)
         self.assertEqual(fcr['net_change'].sum(), 11)
 
+    def test_has_coverage(self):
         # we know this repo doesnt have coverage
         self.assertFalse(self.repo.has_coverage())
 
+    def test_bus_factor(self):
         # we know this repo only has one committer
         self.assertEqual(self.repo.bus_factor(by='repository')['bus factor'].values[0], 1)
 
-        # lets do some blaming
-
+    def test_blame(self):
         blame = self.repo.blame(ignore_globs=['*.[!p][!y]'])
         self.assertEqual(blame['loc'].sum(), 10)
         self.assertEqual(blame.shape[0], 1)
 
+    def test_file_detail(self):
+        fd = self.repo.file_detail()
+        self.assertEqual(fd.shape[0], 6)
+        self.assertEqual(fd['loc'].sum(), 11)
+
+        # we know this repo only has one committer, so they own every file
+        committer = self.commit_history['committer'].values[0]
+        self.assertTrue((fd['file_owner'] == committer).all())
+
+    def test_cumulative_blame(self):
         cblame = self.repo.cumulative_blame()
+        committers = [x for x in cblame.columns.values if x != 'repository']
         self.assertEqual(cblame.shape[0], 6)
-        self.assertEqual(cblame[cblame.columns.values[0]].sum(), 36)
-        cblame = self.repo.cumulative_blame()
+        self.assertEqual(cblame[committers[0]].sum(), 36)
+
+    def test_punchcard(self):
+        punchcard = self.repo.punchcard(branch='master')
+        self.assertEqual(punchcard['net'].sum(), 11)
+
+        # every commit's (hour, weekday) cell is in the punchcard, and only those
+        expected = set(zip(self.commit_history.index.hour, self.commit_history.index.weekday))
+        self.assertEqual(set(zip(punchcard['hour_of_day'], punchcard['day_of_week'])), expected)
+        self.assertEqual(punchcard['hour_of_day'].dtype, 'int64')
+        self.assertEqual(punchcard['day_of_week'].dtype, 'int64')
+
+    def test_revs(self):
+        for num_datapoints in [1, 2, 3]:
+            with self.subTest(num_datapoints=num_datapoints):
+                revs = self.repo.revs(num_datapoints=num_datapoints)
+                self.assertEqual(revs.shape[0], num_datapoints)
+
+        for limit in [1, 2, 6]:
+            with self.subTest(limit=limit):
+                revs = self.repo.revs(limit=limit)
+                self.assertEqual(revs.shape[0], limit)
+
+        self.assertEqual(self.revs.shape[0], 6)
 
-        revs = self.repo.revs(num_datapoints=2)
-        self.assertEqual(revs.shape[0], 2)
-        revs = self.repo.revs(limit=2)
-        self.assertEqual(revs.shape[0], 2)
-        revs = self.repo.revs()
-        self.assertEqual(revs.shape[0], 6)
 
+class TestLocalHistory(unittest.TestCase):
+    """
+    Checks the commit and file change history read from git log against a small history with the cases its parser
+    has to handle: a multi-line commit message, a binary file, paths that git quotes, a merge, and a merge that keeps
+    its first parent's tree (as git merge -s ours does), which has no changes of its own. The repository's
+    config asks git log to hide the root commit's diff and to show signatures, which the history must not depend on.
+
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.project_dir = make_fixture_dir()
+        repo_dir = cls.project_dir + os.sep + 'repository1'
+        os.makedirs(repo_dir)
+
+        cls.commit_date = int(time.time()) - 600
+        commits = [
+            (
+                'first commit\n\nwith a description\nover two lines',
+                {
+                    'README.md': 'Sample README\n',
+                    'données.txt': 'one\ntwo\n',
+                    'with "quote".txt': 'one\n',
+                    'logo.png': b'\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR'
+                },
+                cls.commit_date
+            ),
+            ('update the readme', {'README.md': 'Sample README\nwith more\nto it\n'}, cls.commit_date + 2, [0]),
+            ('add a feature', {'feature.py': 'import os\n'}, cls.commit_date + 4, [0]),
+            ('merge the feature', {'feature.py': 'import os\n'}, cls.commit_date + 6, [1, 2]),
+            ('try an idea', {'README.md': 'Sample README\n', 'idea.py': 'import sys\n'}, cls.commit_date + 8, [3]),
+            ('merge the idea, keeping ours', {}, cls.commit_date + 10, [3, 4]),
+        ]
+        grepo = build_repo_fast_import(repo_dir, commits)
+
+        with grepo.config_writer() as config:
+            config.set_value('log', 'showRoot', 'false')
+            config.set_value('log', 'showSignature', 'true')
+
+        cls.repo = Repository(working_dir=repo_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.repo.cleanup()
+        shutil.rmtree(cls.project_dir, ignore_errors=True)
+
+    def test_commit_history(self):
+        ch = self.repo.commit_history(branch='master')
+
+        # newest first, the merge diffed against its first parent only and the merge with no changes of its own left out
+        self.assertEqual(list(ch['message'].values), [
+            'try an idea\n',
+            'merge the feature\n',
+            'add a feature\n',
+            'update the readme\n',
+            'first commit\n\nwith a description\nover two lines\n',
+        ])
+        self.assertEqual(list(ch['insertions'].values), [1, 1, 1, 2, 4])
+        self.assertEqual(list(ch['deletions'].values), [2, 0, 0, 0, 0])
+        self.assertEqual([int(x.timestamp()) for x in ch.index], [self.commit_date + x for x in [8, 6, 4, 2, 0]])
+        self.assertTrue((ch['committer'] == 'Test User').all())
+
+    def test_file_change_history(self):
+        fch = self.repo.file_change_history(branch='master')
+        rows = sorted(zip(fch['message'].str.split('\n').str[0], fch['filename'], fch['insertions'], fch['deletions']))
+        self.assertEqual(rows, [
+            ('add a feature', 'feature.py', 1, 0),
+            ('first commit', 'README.md', 1, 0),
+            ('first commit', 'données.txt', 2, 0),
+            ('first commit', 'logo.png', 0, 0),
+            ('first commit', 'with "quote".txt', 1, 0),
+            ('merge the feature', 'feature.py', 1, 0),
+            ('try an idea', 'README.md', 0, 2),
+            ('try an idea', 'idea.py', 1, 0),
+            ('update the readme', 'README.md', 2, 0),
+        ])
+
+        # the unquoted paths are what the globs match against
+        fch2 = self.repo.file_change_history(branch='master', include_globs=['donn*'])
+        self.assertEqual(list(fch2['filename'].values), ['données.txt'])
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import subprocess
+import git
+
+__author__ = 'willmcginnis'
+
+# the remote tests clone from github, so they only run when asked to
+REMOTE_TESTS = os.environ.get('GITPANDAS_REMOTE_TESTS', '') not in ('', '0')
+
+
+def make_fixture_dir():
+    """
+    Makes a fresh temporary directory to build test repositories in, so that parallel test workers never share one.
+    It is made in /dev/shm where that exists, so the repositories' files and objects are never written to disk.
+
+    :return: str
+    """
+
+    return tempfile.mkdtemp(dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+
+def build_repo_fast_import(repo_dir, commits):
+    """
+    Builds a (non-bare) git repository at repo_dir whose master branch has one commit per (message, {filename: content},
+    unix timestamp) tuple in commits, all by the same committer. Each commit's parent is the one before it, unless the
+    tuple has a fourth element listing the indexes of its parents in commits, first parent first, which is how side
+    branches and merges are made. A merge's tree is its first parent's plus its own files. Content is str or bytes.
+    The whole history is streamed into a single git fast-import process rather than running an add and a commit per
+    revision, so nothing is checked out into the working tree.
+
+    :param repo_dir: the directory to create the repository in
+    :param commits: a list of (message, {filename: content}, commit_date[, parents]) tuples, oldest first
+    :return: git.Repo
+    """
+
+    grepo = git.Repo.init(repo_dir)
+
+    stream = b''
+    for idx, (message, files, commit_date, *parents) in enumerate(commits):
+        message = (message + '\n').encode('utf-8')
+        stream += b'commit refs/heads/master\n'
+        stream += b'mark :%d\n' % (idx + 1, )
+        stream += b'committer Test User <test@example.com> %d +0000\n' % (commit_date, )
+        stream += b'data %d\n%s\n' % (len(message), message)
+        if parents:
+            stream += b'from :%d\n' % (parents[0][0] + 1, )
+            for parent in parents[0][1:]:
+                stream += b'merge :%d\n' % (parent + 1, )
+        for filename, content in files.items():
+            content = content.encode('utf-8') if isinstance(content, str) else content
+            stream += b'M 100644 inline %s\ndata %d\n%s\n' % (filename.encode('utf-8'), len(content), content)
+
+    # the repository is thrown away after the tests, so the import doesn't need to fsync its pack and refs
+    proc = grepo.git(c='core.fsync=none').fast_import(quiet=True, as_process=True, istream=subprocess.PIPE)
+    proc.stdin.write(stream)
+    proc.stdin.close()
+    proc.wait()
+
+    # point HEAD at the imported branch whatever init.defaultBranch is set to, which is all symbolic-ref would do
+    with open(grepo.git_dir + os.sep + 'HEAD', 'w') as f:
+        f.write('ref: refs/heads/master\n')
+
+    return grepo